@@ -1,6 +1,7 @@
-from sqlalchemy import create_engine
+from sqlalchemy import inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
 
@@ -9,18 +10,47 @@ load_dotenv()
 # Use SQLite for development, PostgreSQL for production
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./price_tracker.db")
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-)
+# All DB access goes through async drivers so DB I/O yields to the event loop;
+# plain URLs from .env are mapped to their async driver automatically
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def _async_url():
+    url = make_url(DATABASE_URL)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+
+engine = create_async_engine(_async_url(), connect_args=connect_args)
+
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+def create_schema(conn):
+    """Create missing tables, plus columns and indexes added to tables that already exist"""
+    Base.metadata.create_all(conn)
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        # Only nullable columns without server defaults can be added this way
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+        # Indexes created before they were declared partial for this dialect are
+        # dropped, so they come back with their WHERE clause
+        partial = f"{conn.dialect.name}_where"
+        indexes = {index["name"]: index for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            reflected = indexes.get(index.name)
+            if (
+                reflected is not None
+                and index.kwargs.get(partial) is not None
+                and partial not in reflected.get("dialect_options", {})
+            ):
+                index.drop(conn)
+            index.create(conn, checkfirst=True)
+
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -1,19 +1,39 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select, update, tuple_, func, case
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import List, Optional
+from pydantic import TypeAdapter
+import base64
+import hashlib
+import json
+import os
+import sys
 import uvicorn
 
-from database import get_db, engine
-from models import Base, Item, PriceHistory, Alert
-from schemas import ItemCreate, ItemResponse, PriceHistoryResponse, AlertResponse
+from database import get_db, engine, create_schema
+from models import Item, PriceHistory, Alert
+from schemas import (
+    ItemCreate, ItemResponse, AlertResponse, ItemPage, PriceHistoryPage, AlertPage,
+    SimilarItemResponse, BetterDealResponse
+)
 from price_monitor import price_monitor
+from notifications import email_notifier
 from similarity import similarity_engine
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+app = FastAPI(
+    title="Price Tracker API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # orjson encodes list responses several times faster
+)
 
-app = FastAPI(title="Price Tracker API", version="1.0.0")
+# Validate whole result lists in one pydantic-core call instead of per-row from_orm
+SIMILAR_ITEMS_ADAPTER = TypeAdapter(List[SimilarItemResponse])
+BETTER_DEALS_ADAPTER = TypeAdapter(List[BetterDealResponse])
 
 # CORS middleware
 app.add_middleware(
@@ -24,15 +44,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger payloads such as long price histories
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+def encode_cursor(*values) -> str:
+    """Encode the sort key of the last row on a page as an opaque cursor"""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def decode_cursor(cursor: str, *types) -> tuple:
+    """Decode a cursor produced by encode_cursor into typed sort key values"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return tuple(
+            datetime.fromisoformat(v) if t is datetime else t(v)
+            for t, v in zip(types, payload, strict=True)
+        )
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def paginate(rows: list, limit: int, key) -> dict:
+    """Split a limit + 1 result set into one page and the cursor for the next"""
+    next_cursor = encode_cursor(*key(rows[limit - 1])) if len(rows) > limit else None
+    return {"items": rows[:limit], "next_cursor": next_cursor}
+
+def check_etag(request: Request, response: Response, *state) -> Optional[Response]:
+    """
+    Tag a GET response with a weak ETag derived from the query string and a
+    cheap summary of the underlying rows. Returns a 304 response when the
+    client's If-None-Match already has it, so the caller can skip the query.
+    """
+    digest = hashlib.blake2b(repr((request.url.query, state)).encode(), digest_size=16).hexdigest()
+    headers = {"ETag": f'W/"{digest}"', "Cache-Control": "private, no-cache"}
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    if headers["ETag"] in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    
+    response.headers.update(headers)
+    return None
+
+async def get_item_or_404(item_id: int, db: AsyncSession = Depends(get_db)) -> Item:
+    """Load the item named in the path once per request, or 404"""
+    item = await db.get(Item, item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return item
+
 @app.on_event("startup")
 async def startup_event():
-    """Start background price monitoring on app startup"""
+    """Create tables and start background price monitoring on app startup"""
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(create_schema)
+    except DBAPIError:
+        # Another worker changed the schema concurrently; retry to pick up
+        # anything it had not created yet
+        async with engine.begin() as conn:
+            await conn.run_sync(create_schema)
     price_monitor.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Stop background monitoring on app shutdown"""
-    price_monitor.stop()
+    """Stop background monitoring and close the SMTP connection on app shutdown"""
+    await price_monitor.stop()
+    await email_notifier.close()
 
 @app.get("/")
 async def root():
@@ -43,7 +119,7 @@ async def health_check():
     return {"status": "healthy"}
 
 @app.post("/items", response_model=ItemResponse)
-async def create_item(item: ItemCreate, db: Session = Depends(get_db)):
+async def create_item(item: ItemCreate, db: AsyncSession = Depends(get_db)):
     """Add a new item to track"""
     db_item = Item(
         name=item.name,
@@ -54,171 +130,221 @@ async def create_item(item: ItemCreate, db: Session = Depends(get_db)):
         description=item.description
     )
     db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+    await db.commit()
+    await db.refresh(db_item)
     return db_item
 
-@app.get("/items", response_model=List[ItemResponse])
-async def get_items(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all tracked items"""
-    items = db.query(Item).filter(Item.is_active == True).offset(skip).limit(limit).all()
-    return items
+@app.get("/items", response_model=ItemPage)
+async def get_items(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get all tracked items, paginated by id"""
+    state = await db.execute(
+        select(func.max(Item.updated_at), func.max(Item.id), func.count())
+        .where(Item.is_active == True)
+    )
+    not_modified = check_etag(request, response, *state.one())
+    if not_modified:
+        return not_modified
+    
+    query = select(Item).where(Item.is_active == True)
+    
+    if cursor:
+        (last_id,) = decode_cursor(cursor, int)
+        query = query.where(Item.id > last_id)
+    
+    result = await db.execute(query.order_by(Item.id).limit(limit + 1))
+    return paginate(result.scalars().all(), limit, lambda item: (item.id,))
 
 @app.get("/items/{item_id}", response_model=ItemResponse)
-async def get_item(item_id: int, db: Session = Depends(get_db)):
+async def get_item(request: Request, response: Response, item: Item = Depends(get_item_or_404)):
     """Get a specific item"""
-    item = db.query(Item).filter(Item.id == item_id).first()
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    return item
+    not_modified = check_etag(request, response, item.id, item.updated_at, item.is_active)
+    return not_modified or item
 
 @app.delete("/items/{item_id}")
-async def delete_item(item_id: int, db: Session = Depends(get_db)):
+async def delete_item(item_id: int, db: AsyncSession = Depends(get_db)):
     """Delete an item"""
-    item = db.query(Item).filter(Item.id == item_id).first()
+    item = await db.get(Item, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     item.is_active = False
-    db.commit()
+    await db.commit()
     return {"message": "Item deleted successfully"}
 
-@app.get("/items/{item_id}/history", response_model=List[PriceHistoryResponse])
-async def get_price_history(item_id: int, db: Session = Depends(get_db)):
-    """Get price history for an item"""
-    history = db.query(PriceHistory).filter(PriceHistory.item_id == item_id).all()
-    return history
+@app.get("/items/{item_id}/history", response_model=PriceHistoryPage)
+async def get_price_history(
+    item_id: int,
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get price history for an item, newest first"""
+    # History is append-only, so the newest id and row count identify it
+    state = await db.execute(
+        select(func.max(PriceHistory.id), func.count()).where(PriceHistory.item_id == item_id)
+    )
+    not_modified = check_etag(request, response, *state.one())
+    if not_modified:
+        return not_modified
+    
+    query = select(PriceHistory).where(PriceHistory.item_id == item_id)
+    
+    if cursor:
+        last_recorded_at, last_id = decode_cursor(cursor, datetime, int)
+        query = query.where(
+            tuple_(PriceHistory.recorded_at, PriceHistory.id) < (last_recorded_at, last_id)
+        )
+    
+    result = await db.execute(
+        query.order_by(PriceHistory.recorded_at.desc(), PriceHistory.id.desc()).limit(limit + 1)
+    )
+    return paginate(result.scalars().all(), limit, lambda ph: (ph.recorded_at, ph.id))
 
 # Alert endpoints
-@app.get("/alerts", response_model=List[AlertResponse])
+@app.get("/alerts", response_model=AlertPage)
 async def get_alerts(
-    skip: int = 0,
-    limit: int = 100,
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1),
     unread_only: bool = False,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get all alerts with optional filtering
     
     Query params:
-    - skip: Pagination offset
+    - cursor: next_cursor from the previous page
     - limit: Max results to return
     - unread_only: If true, only return unread alerts
     """
-    query = db.query(Alert)
+    # Alerts change by insert, delete, or being marked read
+    state = await db.execute(
+        select(func.max(Alert.id), func.count(), func.count(case((Alert.is_read == True, 1))))
+    )
+    not_modified = check_etag(request, response, *state.one())
+    if not_modified:
+        return not_modified
+    
+    query = select(Alert)
     
     if unread_only:
-        query = query.filter(Alert.is_read == False)
+        query = query.where(Alert.is_read == False)
     
-    alerts = query.order_by(Alert.sent_at.desc()).offset(skip).limit(limit).all()
-    return alerts
+    if cursor:
+        last_sent_at, last_id = decode_cursor(cursor, datetime, int)
+        query = query.where(tuple_(Alert.sent_at, Alert.id) < (last_sent_at, last_id))
+    
+    result = await db.execute(
+        query.order_by(Alert.sent_at.desc(), Alert.id.desc()).limit(limit + 1)
+    )
+    return paginate(result.scalars().all(), limit, lambda alert: (alert.sent_at, alert.id))
 
 @app.get("/alerts/{alert_id}", response_model=AlertResponse)
-async def get_alert(alert_id: int, db: Session = Depends(get_db)):
+async def get_alert(alert_id: int, db: AsyncSession = Depends(get_db)):
     """Get a specific alert"""
-    alert = db.query(Alert).filter(Alert.id == alert_id).first()
+    alert = await db.get(Alert, alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="Alert not found")
     return alert
 
 @app.patch("/alerts/{alert_id}/read")
-async def mark_alert_read(alert_id: int, db: Session = Depends(get_db)):
+async def mark_alert_read(alert_id: int, db: AsyncSession = Depends(get_db)):
     """Mark an alert as read"""
-    alert = db.query(Alert).filter(Alert.id == alert_id).first()
+    alert = await db.get(Alert, alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="Alert not found")
     
     alert.is_read = True
-    db.commit()
+    await db.commit()
     return {"message": "Alert marked as read"}
 
 @app.patch("/alerts/read-all")
-async def mark_all_alerts_read(db: Session = Depends(get_db)):
+async def mark_all_alerts_read(db: AsyncSession = Depends(get_db)):
     """Mark all alerts as read"""
-    db.query(Alert).update({"is_read": True})
-    db.commit()
-    return {"message": "All alerts marked as read"}
+    result = await db.execute(
+        update(Alert)
+        .where(Alert.is_read == False)
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return {"message": "All alerts marked as read", "updated": result.rowcount}
 
 @app.delete("/alerts/{alert_id}")
-async def delete_alert(alert_id: int, db: Session = Depends(get_db)):
+async def delete_alert(alert_id: int, db: AsyncSession = Depends(get_db)):
     """Delete an alert"""
-    alert = db.query(Alert).filter(Alert.id == alert_id).first()
+    alert = await db.get(Alert, alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="Alert not found")
     
-    db.delete(alert)
-    db.commit()
+    await db.delete(alert)
+    await db.commit()
     return {"message": "Alert deleted successfully"}
 
 # Similarity/AI endpoints
-@app.get("/items/{item_id}/similar")
+@app.get("/items/{item_id}/similar", response_model=List[SimilarItemResponse])
 async def get_similar_items(
-    item_id: int,
     min_similarity: float = 0.75,
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(None, ge=1),
+    item: Item = Depends(get_item_or_404),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Find similar items using AI embeddings
     
     Query params:
     - min_similarity: Minimum similarity score (0-1), default 0.75
+    - limit: Max results to return, most similar first (default: all)
     """
-    item = db.query(Item).filter(Item.id == item_id).first()
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
+    similar_items = await similarity_engine.find_similar_items(item, db, min_similarity, limit=limit)
     
-    similar_items = await similarity_engine.find_similar_items(item, db, min_similarity)
-    
-    # Format response
-    results = []
-    for similar in similar_items:
-        results.append({
-            "item": ItemResponse.from_orm(similar['item']),
-            "similarity_score": similar['similarity_score']
-        })
-    
-    return results
+    results = SIMILAR_ITEMS_ADAPTER.validate_python(similar_items, from_attributes=True)
+    return ORJSONResponse(SIMILAR_ITEMS_ADAPTER.dump_python(results))
 
-@app.get("/items/{item_id}/better-deals")
+@app.get("/items/{item_id}/better-deals", response_model=List[BetterDealResponse])
 async def get_better_deals(
-    item_id: int,
-    db: Session = Depends(get_db)
+    item: Item = Depends(get_item_or_404),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Find similar items with better prices (at least 10% cheaper)
     """
-    item = db.query(Item).filter(Item.id == item_id).first()
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    
     better_deals = await similarity_engine.find_better_deals(item, db)
     
-    # Format response
-    results = []
-    for deal in better_deals:
-        results.append({
-            "item": ItemResponse.from_orm(deal['item']),
-            "similarity_score": deal['similarity_score'],
-            "savings": deal['savings'],
-            "savings_percent": deal['savings_percent']
-        })
-    
-    return results
+    results = BETTER_DEALS_ADAPTER.validate_python(better_deals, from_attributes=True)
+    return ORJSONResponse(BETTER_DEALS_ADAPTER.dump_python(results))
 
 @app.post("/items/{item_id}/find-alternatives")
 async def trigger_similarity_check(
-    item_id: int,
-    db: Session = Depends(get_db)
+    item: Item = Depends(get_item_or_404),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Manually trigger similarity check and create alerts for better deals
     """
-    item = db.query(Item).filter(Item.id == item_id).first()
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    
     await similarity_engine.create_similar_item_alerts(item, db)
     
     return {"message": "Similarity check completed, alerts created if alternatives found"}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # (2 x CPU) + 1 workers; uvloop and httptools are installed by uvicorn[standard]
+    # on Linux/macOS. Only one worker runs the price monitor (see PriceMonitor.start).
+    # Similarity caches are per worker but checked against the database on use,
+    # so a change made through one worker is seen by the rest.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("WEB_CONCURRENCY", (2 * (os.cpu_count() or 1)) + 1)),
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        limit_concurrency=1000
+    )
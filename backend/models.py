@@ -1,8 +1,18 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, Index, LargeBinary
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from database import Base
 
+# SQLite's CURRENT_TIMESTAMP has no fractional seconds; bind Python datetimes in
+# the same format so keyset cursors compare equal to the stored values
+Timestamp = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(
+        storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+    ),
+    "sqlite"
+)
+
 class Item(Base):
     __tablename__ = "items"
     
@@ -16,9 +26,25 @@ class Item(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     is_active = Column(Boolean, default=True)
+    # Cached unit-length float32 embedding of name + description, valid while
+    # embedding_hash matches the hash of the current text and model. Deferred so
+    # item listings and price checks don't read ~6KB per row; the similarity
+    # engine undefers it where needed.
+    embedding = deferred(Column(LargeBinary))
+    embedding_hash = Column(String(64))
+    
+    # Relationships never lazy-load: that issues one query per parent row and is
+    # not allowed under AsyncSession, so lazy="raise_on_sql" turns an accidental
+    # N+1 into an error. Eager-load them per query with selectinload(), or
+    # declare lazy="selectin" to always batch them in a single IN query (avoid
+    # that for price_history, which grows unbounded).
+    price_history = relationship("PriceHistory", back_populates="item", lazy="raise_on_sql")
+    alerts = relationship("Alert", back_populates="item", foreign_keys="Alert.item_id", lazy="raise_on_sql")
     
-    price_history = relationship("PriceHistory", back_populates="item")
-    alerts = relationship("Alert", back_populates="item")
+    __table_args__ = (
+        # Every /items request filters on is_active and pages by id
+        Index("ix_items_active_id", "is_active", "id"),
+    )
 
 class PriceHistory(Base):
     __tablename__ = "price_history"
@@ -26,9 +52,14 @@ class PriceHistory(Base):
     id = Column(Integer, primary_key=True, index=True)
     item_id = Column(Integer, ForeignKey("items.id"))
     price = Column(Float, nullable=False)
-    recorded_at = Column(DateTime(timezone=True), server_default=func.now())
+    recorded_at = Column(Timestamp, server_default=func.now())
     
-    item = relationship("Item", back_populates="price_history")
+    item = relationship("Item", back_populates="price_history", lazy="raise_on_sql")
+    
+    __table_args__ = (
+        # Keyset pagination for /items/{id}/history
+        Index("ix_price_history_item_recorded_id", "item_id", "recorded_at", "id"),
+    )
 
 class Alert(Base):
     __tablename__ = "alerts"
@@ -37,7 +68,31 @@ class Alert(Base):
     item_id = Column(Integer, ForeignKey("items.id"))
     alert_type = Column(String)  # "price_drop", "similar_item"
     message = Column(Text)
-    sent_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(Timestamp, server_default=func.now())
     is_read = Column(Boolean, default=False)
+    # The cheaper item a "similar_item" alert points to
+    related_item_id = Column(Integer, ForeignKey("items.id"))
+    
+    item = relationship("Item", back_populates="alerts", foreign_keys=[item_id], lazy="raise_on_sql")
     
-    item = relationship("Item", back_populates="alerts")
+    __table_args__ = (
+        # Keyset pagination for /alerts (newest first)
+        Index("ix_alerts_sent_at_id", sent_at.desc(), id.desc()),
+        # unread_only=true only walks the (small) unread subset
+        Index(
+            "ix_alerts_unread_sent_at_id", sent_at.desc(), id.desc(),
+            postgresql_where=(is_read == False),
+            sqlite_where=(is_read == False)
+        ),
+        # Per-item alert lookups (similar-item dedupe, item cleanup)
+        Index("ix_alerts_item_type", "item_id", "alert_type"),
+    )
+
+class EmbeddingCache(Base):
+    __tablename__ = "embedding_cache"
+    
+    # Content address: hash of model + canonical text (SimilarityEngine.embedding_hash),
+    # so identical listings share one embedding and one API call
+    text_hash = Column(String(64), primary_key=True)
+    embedding = Column(LargeBinary, nullable=False)  # unit-length float32
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
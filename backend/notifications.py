@@ -1,5 +1,7 @@
 import os
+import asyncio
 import aiosmtplib
+import jinja2
 from email.message import EmailMessage
 from typing import List, Optional
 import logging
@@ -8,6 +10,121 @@ from models import Alert, Item
 
 logger = logging.getLogger(__name__)
 
+# Email templates are compiled once at import; autoescape keeps item names and
+# alert messages from injecting HTML into the email
+TEMPLATES = {
+    "batch": """
+        <html>
+        <head>
+            <style>
+                body { font-family: Arial, sans-serif; }
+                .alert { 
+                    border: 1px solid #ddd; 
+                    padding: 15px; 
+                    margin: 10px 0; 
+                    border-radius: 5px; 
+                }
+                .price-drop { background-color: #e8f5e9; }
+                .similar-item { background-color: #e3f2fd; }
+                .item-name { font-size: 18px; font-weight: bold; }
+                .price { color: #2e7d32; font-size: 20px; font-weight: bold; }
+                .link { color: #1976d2; text-decoration: none; }
+            </style>
+        </head>
+        <body>
+            <h2>Your Price Tracker Alerts</h2>
+            {% for item, alert in alerts %}
+            <div class="alert {{ 'price-drop' if alert.alert_type == 'price_drop' else 'similar-item' }}">
+                <div class="item-name">{{ item.name }}</div>
+                <p>{{ alert.message }}</p>
+                <a href="{{ item.url }}" class="link">View Item →</a>
+            </div>
+            {% endfor %}
+        </body>
+        </html>
+    """,
+    "price_drop": """
+        <html>
+        <head>
+            <style>
+                body { font-family: Arial, sans-serif; }
+                .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+                .header { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
+                           color: white; padding: 30px; border-radius: 10px 10px 0 0; }
+                .content { background: #f5f5f5; padding: 30px; }
+                .price-box { background: white; padding: 20px; border-radius: 10px; 
+                             margin: 20px 0; text-align: center; }
+                .price { color: #2e7d32; font-size: 36px; font-weight: bold; }
+                .button { background: #667eea; color: white; padding: 15px 30px; 
+                          text-decoration: none; border-radius: 5px; display: inline-block; 
+                          margin-top: 20px; }
+                .footer { background: #333; color: #aaa; padding: 20px; 
+                          border-radius: 0 0 10px 10px; font-size: 12px; }
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>🎉 Price Drop Alert!</h1>
+                    <p>The item you're tracking has dropped to your target price</p>
+                </div>
+                <div class="content">
+                    <h2>{{ item.name }}</h2>
+                    {% if item.image_url %}<img src="{{ item.image_url }}" style="max-width: 100%; border-radius: 10px;" />{% endif %}
+                    <div class="price-box">
+                        <p>Current Price</p>
+                        <div class="price">${{ "%.2f"|format(item.current_price) }}</div>
+                        {% if item.target_price %}<p style="color: #666;">Target: ${{ "%.2f"|format(item.target_price) }}</p>{% endif %}
+                    </div>
+                    <p>{{ alert.message }}</p>
+                    <a href="{{ item.url }}" class="button">View Item Now →</a>
+                </div>
+                <div class="footer">
+                    <p>You're receiving this because you set up price tracking for this item.</p>
+                    <p>Price Tracker - Smart Shopping Assistant</p>
+                </div>
+            </div>
+        </body>
+        </html>
+    """,
+    "similar_item": """
+        <html>
+        <head>
+            <style>
+                body { font-family: Arial, sans-serif; }
+                .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+                .header { background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%); 
+                           color: white; padding: 30px; border-radius: 10px 10px 0 0; }
+                .content { background: #f5f5f5; padding: 30px; }
+                .button { background: #f5576c; color: white; padding: 15px 30px; 
+                          text-decoration: none; border-radius: 5px; display: inline-block; 
+                          margin-top: 20px; }
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>💡 Better Alternative Found!</h1>
+                    <p>We found a similar item at a better price</p>
+                </div>
+                <div class="content">
+                    <h2>{{ item.name }}</h2>
+                    <p>{{ alert.message }}</p>
+                    <a href="{{ item.url }}" class="button">View Original Item →</a>
+                </div>
+            </div>
+        </body>
+        </html>
+    """,
+    "generic": "<p>{{ alert.message }}</p>",
+}
+
+template_env = jinja2.Environment(loader=jinja2.DictLoader(TEMPLATES), autoescape=True)
+BATCH_TEMPLATE = template_env.get_template("batch")
+PRICE_DROP_TEMPLATE = template_env.get_template("price_drop")
+SIMILAR_ITEM_TEMPLATE = template_env.get_template("similar_item")
+GENERIC_TEMPLATE = template_env.get_template("generic")
+
 class EmailNotifier:
     """
     Email notification service for price alerts
@@ -18,6 +135,8 @@ class EmailNotifier:
     - Environment config: Flexible SMTP provider (Gmail, SendGrid, AWS SES)
     - Graceful failure: Email errors don't crash the app
     - Batch sending: Group alerts to avoid spam
+    - Persistent connection: One authenticated SMTP session is reused across
+      emails and reopened when the server drops it
     
     Tradeoffs:
     - SMTP vs dedicated service (SendGrid API):
@@ -33,6 +152,9 @@ class EmailNotifier:
         self.from_email = os.getenv("FROM_EMAIL", self.smtp_user)
         self.to_email = os.getenv("NOTIFICATION_EMAIL")  # User's email
         
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._smtp_lock = asyncio.Lock()  # One SMTP transaction at a time
+        
         if not self.smtp_user or not self.smtp_password:
             logger.warning("SMTP credentials not configured - email notifications disabled")
             self.enabled = False
@@ -52,7 +174,7 @@ class EmailNotifier:
         elif alert.alert_type == "similar_item":
             html_body = self._create_similar_item_email(item, alert)
         else:
-            html_body = f"<p>{alert.message}</p>"
+            html_body = GENERIC_TEMPLATE.render(alert=alert)
         
         await self._send_email(subject, html_body)
     
@@ -65,124 +187,43 @@ class EmailNotifier:
             return
         
         subject = f"🔔 {len(alerts)} New Price Alerts"
-        
-        html_body = """
-        <html>
-        <head>
-            <style>
-                body { font-family: Arial, sans-serif; }
-                .alert { 
-                    border: 1px solid #ddd; 
-                    padding: 15px; 
-                    margin: 10px 0; 
-                    border-radius: 5px; 
-                }
-                .price-drop { background-color: #e8f5e9; }
-                .similar-item { background-color: #e3f2fd; }
-                .item-name { font-size: 18px; font-weight: bold; }
-                .price { color: #2e7d32; font-size: 20px; font-weight: bold; }
-                .link { color: #1976d2; text-decoration: none; }
-            </style>
-        </head>
-        <body>
-            <h2>Your Price Tracker Alerts</h2>
-        """
-        
-        for item, alert in alerts:
-            alert_class = "price-drop" if alert.alert_type == "price_drop" else "similar-item"
-            html_body += f"""
-            <div class="alert {alert_class}">
-                <div class="item-name">{item.name}</div>
-                <p>{alert.message}</p>
-                <a href="{item.url}" class="link">View Item →</a>
-            </div>
-            """
-        
-        html_body += """
-        </body>
-        </html>
-        """
+        html_body = BATCH_TEMPLATE.render(alerts=alerts)
         
         await self._send_email(subject, html_body)
     
     def _create_price_drop_email(self, item: Item, alert: Alert) -> str:
         """Create HTML email for price drop alert"""
-        return f"""
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                           color: white; padding: 30px; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f5f5f5; padding: 30px; }}
-                .price-box {{ background: white; padding: 20px; border-radius: 10px; 
-                             margin: 20px 0; text-align: center; }}
-                .price {{ color: #2e7d32; font-size: 36px; font-weight: bold; }}
-                .button {{ background: #667eea; color: white; padding: 15px 30px; 
-                          text-decoration: none; border-radius: 5px; display: inline-block; 
-                          margin-top: 20px; }}
-                .footer {{ background: #333; color: #aaa; padding: 20px; 
-                          border-radius: 0 0 10px 10px; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🎉 Price Drop Alert!</h1>
-                    <p>The item you're tracking has dropped to your target price</p>
-                </div>
-                <div class="content">
-                    <h2>{item.name}</h2>
-                    {f'<img src="{item.image_url}" style="max-width: 100%; border-radius: 10px;" />' if item.image_url else ''}
-                    <div class="price-box">
-                        <p>Current Price</p>
-                        <div class="price">${item.current_price:.2f}</div>
-                        {f'<p style="color: #666;">Target: ${item.target_price:.2f}</p>' if item.target_price else ''}
-                    </div>
-                    <p>{alert.message}</p>
-                    <a href="{item.url}" class="button">View Item Now →</a>
-                </div>
-                <div class="footer">
-                    <p>You're receiving this because you set up price tracking for this item.</p>
-                    <p>Price Tracker - Smart Shopping Assistant</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        return PRICE_DROP_TEMPLATE.render(item=item, alert=alert)
     
     def _create_similar_item_email(self, item: Item, alert: Alert) -> str:
         """Create HTML email for similar item alert"""
-        return f"""
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%); 
-                           color: white; padding: 30px; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f5f5f5; padding: 30px; }}
-                .button {{ background: #f5576c; color: white; padding: 15px 30px; 
-                          text-decoration: none; border-radius: 5px; display: inline-block; 
-                          margin-top: 20px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>💡 Better Alternative Found!</h1>
-                    <p>We found a similar item at a better price</p>
-                </div>
-                <div class="content">
-                    <h2>{item.name}</h2>
-                    <p>{alert.message}</p>
-                    <a href="{item.url}" class="button">View Original Item →</a>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        return SIMILAR_ITEM_TEMPLATE.render(item=item, alert=alert)
+    
+    async def _get_smtp(self) -> aiosmtplib.SMTP:
+        """Return the open SMTP connection, reconnecting if it has gone stale"""
+        if self._smtp is not None and self._smtp.is_connected:
+            try:
+                await self._smtp.noop()
+                return self._smtp
+            except aiosmtplib.SMTPException:
+                self._smtp.close()
+        
+        smtp = aiosmtplib.SMTP(
+            hostname=self.smtp_host,
+            port=self.smtp_port,
+            use_tls=False,
+            start_tls=False
+        )
+        try:
+            await smtp.connect()
+            await smtp.starttls()
+            await smtp.login(self.smtp_user, self.smtp_password)
+        except Exception:
+            # Don't leak the socket when TLS or authentication fails
+            smtp.close()
+            raise
+        self._smtp = smtp
+        return smtp
     
     async def _send_email(self, subject: str, html_body: str):
         """Send HTML email via SMTP"""
@@ -194,20 +235,30 @@ class EmailNotifier:
             message.set_content("Please view this email in an HTML-compatible email client.")
             message.add_alternative(html_body, subtype="html")
             
-            async with aiosmtplib.SMTP(
-                hostname=self.smtp_host,
-                port=self.smtp_port,
-                use_tls=False
-            ) as smtp:
-                await smtp.connect()
-                await smtp.starttls()
-                await smtp.login(self.smtp_user, self.smtp_password)
-                await smtp.send_message(message)
+            async with self._smtp_lock:
+                try:
+                    smtp = await self._get_smtp()
+                    await smtp.send_message(message)
+                except aiosmtplib.SMTPServerDisconnected:
+                    # Dropped between the NOOP check and sending - retry once
+                    self._smtp = None
+                    smtp = await self._get_smtp()
+                    await smtp.send_message(message)
             
             logger.info(f"Email sent: {subject}")
         except Exception as e:
             logger.error(f"Failed to send email: {e}")
             # Don't raise - email failures shouldn't crash the app
+    
+    async def close(self):
+        """Close the persistent SMTP connection"""
+        async with self._smtp_lock:
+            if self._smtp is not None and self._smtp.is_connected:
+                try:
+                    await self._smtp.quit()
+                except aiosmtplib.SMTPException:
+                    self._smtp.close()
+            self._smtp = None
 
 # Global instance
 email_notifier = EmailNotifier()
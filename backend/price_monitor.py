@@ -1,9 +1,18 @@
-from apscheduler.schedulers.background import BackgroundScheduler
-from sqlalchemy.orm import Session
-from datetime import datetime
-from typing import List
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import select, insert, update, case, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import Dict, List, Optional
 import logging
 import asyncio
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 from database import SessionLocal
 from models import Item, PriceHistory, Alert
@@ -19,16 +28,56 @@ class PriceMonitor:
     
     Technical Decisions:
     - APScheduler: Lightweight, in-process scheduler (vs Celery which needs Redis/RabbitMQ)
-    - BackgroundScheduler: Runs in separate thread, doesn't block FastAPI
+    - AsyncIOScheduler: Jobs are coroutines on FastAPI's event loop, no extra thread
+      or per-run event loop, so the HTTP and SMTP connections stay open between checks
+    - Concurrent scraping: Items are fetched in parallel, capped by a semaphore
+    - Bulk writes: One executemany INSERT for price history and one
+      UPDATE ... SET current_price = CASE id ... END, updated_at = NOW() for
+      item prices per check, instead of a statement per item
     - 6-hour interval: Balance between responsiveness and not overwhelming sites
+    - Single runner: With several API workers, only the one holding a file lock
+      schedules price checks
     """
     
+    # Max in-flight scrapes per price check
+    max_concurrent_scrapes = 16
+    # Items per bulk price UPDATE (keeps bound parameters under driver limits)
+    price_update_batch_size = 500
+    
     def __init__(self):
-        self.scheduler = BackgroundScheduler()
+        self.scheduler = AsyncIOScheduler()
         self.scraper = PriceScraper()
+        self._lock_file = None
+        
+    def _acquire_runner_lock(self) -> bool:
+        """Take the cross-process lock that elects one worker to run price checks"""
+        lock_path = os.getenv(
+            "PRICE_MONITOR_LOCK",
+            os.path.join(tempfile.gettempdir(), "price_monitor.lock")
+        )
+        # Append mode, so opening never truncates a file another worker has locked
+        lock_file = open(lock_path, "a")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                # Windows: lock the file's first byte
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
         
+        # Held for the life of the process; released by the OS on exit
+        self._lock_file = lock_file
+        return True
+    
     def start(self):
         """Start the background price monitoring"""
+        if not self._acquire_runner_lock():
+            logger.info("Price monitoring already running in another worker")
+            return
+        
         # Check prices every 6 hours
         self.scheduler.add_job(
             self.check_all_prices,
@@ -40,50 +89,91 @@ class PriceMonitor:
         self.scheduler.start()
         logger.info("Price monitoring started - checking every 6 hours")
     
-    def stop(self):
-        """Stop the scheduler"""
-        self.scheduler.shutdown()
+    async def stop(self):
+        """Stop the scheduler and release the scraper's connections and workers"""
+        if self.scheduler.running:
+            self.scheduler.shutdown()
+        await self.scraper.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
         logger.info("Price monitoring stopped")
     
-    def check_all_prices(self):
+    async def check_all_prices(self):
         """Check prices for all active items"""
-        db = SessionLocal()
-        try:
-            items = db.query(Item).filter(Item.is_active == True).all()
-            logger.info(f"Checking prices for {len(items)} items")
-            
-            alerts_to_notify = []  # Collect alerts for batch email
-            
-            for item in items:
-                try:
-                    alert = self._check_item_price(item, db)
+        async with SessionLocal() as db:
+            try:
+                result = await db.execute(select(Item).where(Item.is_active == True))
+                items = result.scalars().all()
+                logger.info(f"Checking prices for {len(items)} items")
+                
+                scrape_results = await self._scrape_all(items)
+                
+                alerts_to_notify = []  # Collect alerts for batch email
+                price_rows = []  # PriceHistory rows to bulk insert
+                new_prices = {}  # item_id -> price, for the bulk update
+                
+                for item, scraped in zip(items, scrape_results):
+                    if isinstance(scraped, Exception):
+                        logger.error(f"Error checking price for item {item.id}: {scraped}")
+                        # Continue with other items even if one fails
+                        continue
+                    alert = self._record_price(item, scraped, db, price_rows, new_prices)
                     if alert:
                         alerts_to_notify.append((item, alert))
-                except Exception as e:
-                    logger.error(f"Error checking price for item {item.id}: {e}")
-                    # Continue with other items even if one fails
-            
-            db.commit()
-            
-            # Send batch email notification
-            if alerts_to_notify:
-                asyncio.run(email_notifier.send_batch_alerts(alerts_to_notify))
-            
-            logger.info("Price check completed")
-        except Exception as e:
-            logger.error(f"Error in price check job: {e}")
-            db.rollback()
-        finally:
-            db.close()
+                
+                if price_rows:
+                    await db.execute(insert(PriceHistory), price_rows)
+                    await self._update_prices(new_prices, db)
+                await db.commit()
+                
+                # Send batch email notification
+                if alerts_to_notify:
+                    await email_notifier.send_batch_alerts(alerts_to_notify)
+                
+                logger.info("Price check completed")
+            except Exception as e:
+                logger.error(f"Error in price check job: {e}")
+                await db.rollback()
     
-    def _check_item_price(self, item: Item, db: Session):
+    async def _scrape_all(self, items: list[Item]) -> list:
         """
-        Check price for a single item
-        Returns alert if one was created, None otherwise
+        Scrape all item URLs concurrently
+        Returns one scrape result (or the raised exception) per item, in order
         """
-        # Scrape current price
-        result = self.scraper.scrape_price(item.url)
+        semaphore = asyncio.Semaphore(self.max_concurrent_scrapes)
+        
+        async def scrape(item: Item):
+            async with semaphore:
+                return await self.scraper.scrape_price(item.url)
         
+        return await asyncio.gather(*(scrape(item) for item in items), return_exceptions=True)
+    
+    async def _update_prices(self, new_prices: Dict[int, float], db: AsyncSession):
+        """Set current prices and a server-side updated_at in one UPDATE per batch"""
+        item_ids = list(new_prices)
+        batch_size = self.price_update_batch_size
+        for start in range(0, len(item_ids), batch_size):
+            batch = {item_id: new_prices[item_id] for item_id in item_ids[start:start + batch_size]}
+            await db.execute(
+                update(Item)
+                .where(Item.id.in_(batch))
+                .values(current_price=case(batch, value=Item.id), updated_at=func.now())
+                .execution_options(synchronize_session=False)
+            )
+    
+    def _record_price(
+        self,
+        item: Item,
+        result: Optional[Dict],
+        db: AsyncSession,
+        price_rows: List[Dict],
+        new_prices: Dict[int, float]
+    ):
+        """
+        Queue a scraped price for a single item into the bulk write lists
+        Returns alert if one was created, None otherwise
+        """
         if not result or result['price'] is None:
             logger.warning(f"Could not fetch price for item {item.id}")
             return
@@ -91,16 +181,13 @@ class PriceMonitor:
         new_price = result['price']
         old_price = item.current_price
         
-        # Update item's current price
-        item.current_price = new_price
-        item.updated_at = datetime.utcnow()
+        # Update item's current price and record it in price history
+        new_prices[item.id] = new_price
+        price_rows.append({"item_id": item.id, "price": new_price})
         
-        # Record in price history
-        price_history = PriceHistory(
-            item_id=item.id,
-            price=new_price
-        )
-        db.add(price_history)
+        # Keep the loaded item current for notifications without queuing a
+        # per-row UPDATE in the unit of work
+        set_committed_value(item, "current_price", new_price)
         
         # Check if price dropped below target
         if item.target_price and new_price <= item.target_price:
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, ConfigDict, HttpUrl
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class ItemCreate(BaseModel):
     name: str
@@ -22,8 +22,7 @@ class ItemResponse(BaseModel):
     updated_at: Optional[datetime]
     is_active: bool
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class PriceHistoryResponse(BaseModel):
     id: int
@@ -31,8 +30,7 @@ class PriceHistoryResponse(BaseModel):
     price: float
     recorded_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class AlertResponse(BaseModel):
     id: int
@@ -42,5 +40,24 @@ class AlertResponse(BaseModel):
     sent_at: datetime
     is_read: bool
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+class SimilarItemResponse(BaseModel):
+    item: ItemResponse
+    similarity_score: float
+
+class BetterDealResponse(SimilarItemResponse):
+    savings: float
+    savings_percent: float
+
+class ItemPage(BaseModel):
+    items: List[ItemResponse]
+    next_cursor: Optional[str] = None
+
+class PriceHistoryPage(BaseModel):
+    items: List[PriceHistoryResponse]
+    next_cursor: Optional[str] = None
+
+class AlertPage(BaseModel):
+    items: List[AlertResponse]
+    next_cursor: Optional[str] = None
@@ -1,81 +1,149 @@
-import requests
+import httpx
+import asyncio
+import multiprocessing
+import os
+import sys
 from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Optional, Dict
 import re
 
+PRICE_RE = re.compile(r'\d+(?:\.\d+)?')
+
+def parse_price_from_html(content: bytes) -> Dict[str, any]:
+    """
+    Parse a product page into a dict with price, title, and image_url
+    Top-level (picklable) so it can run in a worker process
+    """
+    soup = BeautifulSoup(content, 'lxml')
+    
+    return {
+        'price': _extract_price(soup),
+        'title': _extract_title(soup),
+        'image_url': _extract_image(soup)
+    }
+
+def _extract_price(soup: BeautifulSoup) -> Optional[float]:
+    """Extract price from various common price elements"""
+    price_selectors = [
+        {'name': 'span', 'class': 'price'},
+        {'name': 'span', 'class': 'a-price-whole'},
+        {'name': 'span', 'class': 'product-price'},
+        {'itemprop': 'price'}
+    ]
+    
+    for selector in price_selectors:
+        element = soup.find(**selector)
+        if element:
+            price_text = element.get_text()
+            price_match = PRICE_RE.search(price_text.replace(',', ''))
+            if price_match:
+                return float(price_match.group())
+    return None
+
+def _extract_title(soup: BeautifulSoup) -> Optional[str]:
+    """Extract product title"""
+    title_selectors = [
+        {'name': 'h1'},
+        {'itemprop': 'name'},
+        {'name': 'title'}
+    ]
+    
+    for selector in title_selectors:
+        element = soup.find(**selector)
+        if element:
+            return element.get_text().strip()
+    return None
+
+def _extract_image(soup: BeautifulSoup) -> Optional[str]:
+    """Extract product image URL"""
+    img = soup.find('img', itemprop='image')
+    if not img:
+        img = soup.find('img', class_='product-image')
+    if not img:
+        img = soup.find('img')
+    
+    if img and img.get('src'):
+        return img['src']
+    return None
+
 class PriceScraper:
-    """Scrapes product prices from various e-commerce sites"""
+    """
+    Scrapes product prices from various e-commerce sites
+    
+    Requests go through a shared httpx.AsyncClient so many URLs can be fetched
+    concurrently over pooled keep-alive connections. HTML parsing is CPU-bound,
+    so it runs in a process pool instead of blocking the event loop. Pool workers
+    are started from a clean server process rather than forked from the API
+    process with its event loop and driver threads, and a pool broken by a dead
+    worker is replaced.
+    """
     
     def __init__(self):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
+        self._client: Optional[httpx.AsyncClient] = None
+        self._parse_pool: Optional[ProcessPoolExecutor] = None
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared HTTP client, kept open across price checks"""
+        if self._client is None or self._client.is_closed:
+            self._client = self.create_client()
+        return self._client
     
-    def scrape_price(self, url: str) -> Optional[Dict[str, any]]:
+    def create_client(self) -> httpx.AsyncClient:
+        """Create a pooled async HTTP client"""
+        transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(max_connections=32),
+            retries=3
+        )
+        return httpx.AsyncClient(headers=self.headers, follow_redirects=True, transport=transport)
+    
+    @property
+    def parse_pool(self) -> ProcessPoolExecutor:
+        """Worker processes for HTML parsing, started on first use"""
+        if self._parse_pool is None:
+            # forkserver isn't available on Windows
+            context = multiprocessing.get_context("spawn" if sys.platform == "win32" else "forkserver")
+            self._parse_pool = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=context)
+        return self._parse_pool
+    
+    async def parse(self, content: bytes) -> Dict[str, any]:
+        """Parse a page in the process pool, retrying once on a fresh pool if a worker died"""
+        loop = asyncio.get_running_loop()
+        pool = self.parse_pool
+        try:
+            return await loop.run_in_executor(pool, parse_price_from_html, content)
+        except BrokenProcessPool:
+            # Concurrent parses all see the same broken pool; only the first replaces it
+            if self._parse_pool is pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._parse_pool = None
+            return await loop.run_in_executor(self.parse_pool, parse_price_from_html, content)
+    
+    async def close(self):
+        """Close the HTTP client and shut down the parsing worker processes"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown(cancel_futures=True)
+            self._parse_pool = None
+    
+    async def scrape_price(self, url: str) -> Optional[Dict[str, any]]:
         """
         Scrape price from a product URL
         Returns dict with price, title, and image_url
         """
         try:
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = await self.client.get(url, timeout=10)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Try common price selectors
-            price = self._extract_price(soup)
-            title = self._extract_title(soup)
-            image_url = self._extract_image(soup)
-            
-            return {
-                'price': price,
-                'title': title,
-                'image_url': image_url
-            }
+            return await self.parse(response.content)
         except Exception as e:
             print(f"Error scraping {url}: {e}")
             return None
-    
-    def _extract_price(self, soup: BeautifulSoup) -> Optional[float]:
-        """Extract price from various common price elements"""
-        price_selectors = [
-            {'name': 'span', 'class': 'price'},
-            {'name': 'span', 'class': 'a-price-whole'},
-            {'name': 'span', 'class': 'product-price'},
-            {'itemprop': 'price'}
-        ]
-        
-        for selector in price_selectors:
-            element = soup.find(**selector)
-            if element:
-                price_text = element.get_text()
-                price_match = re.search(r'\d+\.?\d*', price_text.replace(',', ''))
-                if price_match:
-                    return float(price_match.group())
-        return None
-    
-    def _extract_title(self, soup: BeautifulSoup) -> Optional[str]:
-        """Extract product title"""
-        title_selectors = [
-            {'name': 'h1'},
-            {'itemprop': 'name'},
-            {'name': 'title'}
-        ]
-        
-        for selector in title_selectors:
-            element = soup.find(**selector)
-            if element:
-                return element.get_text().strip()
-        return None
-    
-    def _extract_image(self, soup: BeautifulSoup) -> Optional[str]:
-        """Extract product image URL"""
-        img = soup.find('img', itemprop='image')
-        if not img:
-            img = soup.find('img', class_='product-image')
-        if not img:
-            img = soup.find('img')
-        
-        if img and img.get('src'):
-            return img['src']
-        return None
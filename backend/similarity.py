@@ -1,25 +1,269 @@
+import asyncio
+import hashlib
+import heapq
 import os
+import time
+from collections import OrderedDict
 from openai import AsyncOpenAI
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Sequence, Tuple
 import numpy as np
-from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, update, bindparam, inspect, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
+from sqlalchemy.orm.attributes import set_committed_value
 import logging
 
-from models import Item, Alert
-from database import SessionLocal
+try:
+    from numba import njit
+except ImportError:  # Optional: the int8 scan falls back to numpy
+    njit = None
+
+from models import Item, Alert, EmbeddingCache
 
 logger = logging.getLogger(__name__)
 
+def unit_vector(embedding) -> np.ndarray:
+    """Scale an embedding to unit length so dot products are cosine similarities"""
+    vec = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+# Set bits per byte value, for numpy versions without np.bitwise_count
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+def _popcount(bits: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bits)
+    return _POPCOUNT[bits]
+
+if njit is not None:
+    # Single-threaded on purpose: the API already runs one worker process per
+    # core, and numba's thread pools don't shut down cleanly in forked workers
+    @njit(cache=True, fastmath=True)
+    def _int8_dots(codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Dot product of every int8 row with an int8 query, with int32 accumulators"""
+        out = np.empty(codes.shape[0], dtype=np.int32)
+        for i in range(codes.shape[0]):
+            acc = np.int32(0)
+            for k in range(codes.shape[1]):
+                acc += np.int32(codes[i, k]) * np.int32(query[k])
+            out[i] = acc
+        return out
+else:
+    def _int8_dots(codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        return np.einsum('ij,j->i', codes, query, dtype=np.int32)
+
+class EmbeddingIndex:
+    """
+    In-memory search index over unit-length item embeddings, by item id
+    
+    - Binary prefilter: one sign bit per dimension (relative to the corpus mean),
+      32x smaller than float32. Large indexes are first cut down to the
+      prefilter_size rows nearest the query by Hamming distance.
+    - Int8 scan: each dimension is calibrated to its min/max over the corpus and
+      split into 256 levels (4x smaller than float32), scanned by a compiled
+      Numba kernel when numba is installed. Scores are approximate
+      (within ~1e-3 of cosine); callers rerank near-threshold candidates
+      against the exact vectors.
+    - Incremental: rows are added and removed by item id. The calibrated range
+      is padded by range_padding on each side, and new vectors outside it are
+      clipped; only a vector whose clipping could move a score by more than
+      max_clip_error needs a rebuild.
+    """
+    
+    def __init__(self, prefilter_size: int = 2048, range_padding: float = 0.1, max_clip_error: float = 0.01):
+        self.prefilter_size = prefilter_size
+        self.range_padding = range_padding
+        self.max_clip_error = max_clip_error
+        # item id -> embedding hash of the indexed vector
+        self.hashes: Dict[int, str] = {}
+        self.ids = np.empty(0, dtype=np.int64)
+        self.codes = np.empty((0, 0), dtype=np.int8)
+        self.bits = np.empty((0, 0), dtype=np.uint8)
+        self.low = self.high = self.scale = self.offset = self.mean = None
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def build(self, vectors: Dict[int, np.ndarray], hashes: Dict[int, str]):
+        """Calibrate on these vectors and replace the index contents with them"""
+        self.__init__(self.prefilter_size, self.range_padding, self.max_clip_error)
+        if not vectors:
+            return
+        
+        matrix = np.vstack(list(vectors.values()))
+        low = matrix.min(axis=0)
+        high = matrix.max(axis=0)
+        # Headroom for vectors added later
+        padding = (high - low) * self.range_padding
+        self.low = low - padding
+        self.high = high + padding
+        self.scale = np.maximum((self.high - self.low) / 255, np.finfo(np.float32).tiny)
+        # Each code stands for the midpoint of its level
+        self.offset = self.low + self.scale * 128.5
+        self.mean = matrix.mean(axis=0)
+        
+        self.ids = np.fromiter(vectors, dtype=np.int64, count=len(vectors))
+        self.codes, self.bits = self._quantize(matrix)
+        self.hashes = dict(hashes)
+    
+    def add(self, vectors: Dict[int, np.ndarray], hashes: Dict[int, str]) -> bool:
+        """
+        Add or replace rows under the current calibration
+        Returns False, leaving the index unchanged, if it needs a rebuild instead
+        """
+        if not vectors:
+            return True
+        if self.low is None:
+            return False
+        matrix = np.vstack(list(vectors.values()))
+        # Clipping to the calibrated range moves a dot product with a unit query
+        # by at most the norm of the overshoot
+        overshoot = np.maximum(self.low - matrix, 0) + np.maximum(matrix - self.high, 0)
+        if np.linalg.norm(overshoot, axis=1).max() > self.max_clip_error:
+            return False
+        
+        self.remove(list(vectors))
+        codes, bits = self._quantize(matrix)
+        self.ids = np.concatenate([self.ids, np.fromiter(vectors, dtype=np.int64, count=len(vectors))])
+        self.codes = np.concatenate([self.codes, codes])
+        self.bits = np.concatenate([self.bits, bits])
+        self.hashes.update(hashes)
+        return True
+    
+    def remove(self, item_ids: List[int]):
+        keep = ~np.isin(self.ids, item_ids)
+        self.ids, self.codes, self.bits = self.ids[keep], self.codes[keep], self.bits[keep]
+        for item_id in item_ids:
+            self.hashes.pop(item_id, None)
+    
+    def search(self, query: np.ndarray, min_score: float) -> np.ndarray:
+        """Ids of items whose approximate dot product with a unit query is >= min_score"""
+        if not len(self):
+            return self.ids
+        
+        rows = np.arange(len(self))
+        if len(rows) > self.prefilter_size:
+            distances = _popcount(self.bits ^ np.packbits(query > self.mean)).sum(axis=1, dtype=np.int32)
+            rows = np.argpartition(distances, self.prefilter_size)[:self.prefilter_size]
+        
+        return self.ids[rows[self._scores(rows, query) >= min_score]]
+    
+    def _quantize(self, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        levels = np.clip(np.floor((matrix - self.low) / self.scale), 0, 255)
+        codes = (levels - 128).astype(np.int8)
+        bits = np.packbits(matrix > self.mean, axis=1)
+        return codes, bits
+    
+    def _scores(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # Fold the per-dimension scales into the query, then quantize it with a
+        # single step so the scan is an int8 dot product with int32 accumulators
+        weighted = self.scale * query
+        step = float(np.abs(weighted).max()) / 127 or 1.0
+        query_codes = np.round(weighted / step).astype(np.int8)
+        codes = self.codes if len(rows) == len(self.codes) else self.codes[rows]
+        dots = _int8_dots(codes, query_codes)
+        return step * dots + float(self.offset @ query)
+
+class LRUCache(OrderedDict):
+    """Dict that drops its least recently used entries beyond maxsize"""
+    
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+    
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+    
+    def put(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+class SimilarityCache:
+    """
+    In-process cache of similarity results as (item_id, similarity_score) lists
+    
+    - Exact hits: keyed by (item_id, min_similarity)
+    - Semantic hits: a query whose embedding is nearly identical to a cached
+      query's (cosine >= semantic_threshold) reuses that query's result
+    - Scores only depend on item text, so entries survive price changes. Each
+      entry records the catalog version (active item count and max id) it was
+      computed against; an entry from another version is a miss, so items added
+      or removed through any worker invalidate it
+    """
+    
+    def __init__(self, ttl_seconds: int = 3600, semantic_threshold: float = 0.95, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self.max_entries = max_entries
+        # (item_id, min_similarity) -> (expires_at, catalog version, unit query embedding, matches)
+        self._entries: OrderedDict = OrderedDict()
+    
+    def get(self, item_id: int, min_similarity: float, version: Tuple) -> Optional[List[Tuple[int, float]]]:
+        """Return cached matches for this exact query, if still fresh"""
+        key = (item_id, min_similarity)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic() or entry[1] != version:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[3]
+    
+    def get_similar(self, embedding: np.ndarray, min_similarity: float, version: Tuple) -> Optional[List[Tuple[int, float]]]:
+        """Return the matches of a cached query with a near-identical embedding"""
+        now = time.monotonic()
+        candidates = [
+            (key[0], entry) for key, entry in self._entries.items()
+            if key[1] == min_similarity and entry[0] >= now and entry[1] == version
+        ]
+        if not candidates:
+            return None
+        
+        query = unit_vector(embedding)
+        scores = np.stack([entry[2] for _, entry in candidates]) @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.semantic_threshold:
+            return None
+        
+        # The cached query item itself is a match too, if it clears the threshold
+        source_id, entry = candidates[best]
+        matches = list(entry[3])
+        if scores[best] >= min_similarity:
+            matches.append((source_id, float(scores[best])))
+        return sorted(matches, key=lambda match: match[1], reverse=True)
+    
+    def set(self, item_id: int, min_similarity: float, version: Tuple, embedding: np.ndarray, matches: List[Tuple[int, float]]):
+        key = (item_id, min_similarity)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, version, unit_vector(embedding), matches)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        self._entries.clear()
+
 class SimilarityEngine:
     """
     AI-powered product similarity detection using OpenAI embeddings
     
     Technical Decisions:
     - OpenAI text-embedding-3-small: Cost-effective ($0.02/1M tokens) vs ada-002 ($0.10/1M)
-    - Cosine similarity: Standard for embeddings, intuitive 0-1 scale
+    - Cosine similarity: Standard for embeddings, intuitive 0-1 scale; searched in a
+      binary/int8-quantized in-memory index, with exact float32 scores for
+      near-threshold items
     - Threshold 0.75: Empirically good balance for product similarity
     - Async calls: Don't block API requests
-    - Cache embeddings: Store in DB to avoid redundant API calls
+    - Cache embeddings: Store in DB to avoid redundant API calls, keyed by a hash
+      of the item text and model so edits or a model change invalidate them;
+      a content-addressed table shares them between identical listings
     """
     
     def __init__(self):
@@ -32,45 +276,201 @@ class SimilarityEngine:
         
         self.model = "text-embedding-3-small"
         self.similarity_threshold = 0.75
+        # Inputs per embeddings request
+        self.embedding_batch_size = 96
+        # Max in-flight embeddings requests, to stay under OpenAI rate limits
+        self.max_concurrent_requests = 32
+        self.cache = SimilarityCache()
+        # (item id, embedding hash) -> query embedding
+        self._query_embeddings = LRUCache(maxsize=1024)
+        # Embedding hash -> embedding, for hot texts without a DB round trip
+        # (~6KB each, per worker process)
+        self._text_embeddings = LRUCache(maxsize=2048)
+        self._index_lock = asyncio.Lock()
+        # Rows per fetch when loading embeddings for the index
+        self.load_batch_size = 1000
+        # Items whose int8 score is this close to the threshold get an exact rescore
+        self.rerank_margin = 0.02
+        # New vectors may be clipped into the index's range by up to half the margin
+        self.index = EmbeddingIndex(max_clip_error=self.rerank_margin / 2)
     
-    async def get_embedding(self, text: str) -> Optional[List[float]]:
+    async def get_embedding(self, text: str) -> Optional[np.ndarray]:
         """Get embedding vector for text"""
+        return (await self.get_embeddings([text]))[0]
+    
+    async def get_embeddings(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Get embedding vectors for many texts, one API request per batch
+        Batches are sent concurrently; returns one vector (or None if its batch
+        failed) per text, in order
+        """
         if not self.client:
-            return None
+            return [None] * len(texts)
         
-        try:
-            response = await self.client.embeddings.create(
-                input=text,
-                model=self.model
-            )
-            return response.data[0].embedding
-        except Exception as e:
-            logger.error(f"Error getting embedding: {e}")
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        
+        async def embed(batch: List[str]) -> List[Optional[np.ndarray]]:
+            async with semaphore:
+                try:
+                    response = await self.client.embeddings.create(
+                        input=batch,
+                        model=self.model
+                    )
+                except Exception as e:
+                    logger.error(f"Error getting embeddings: {e}")
+                    return [None] * len(batch)
+            data = sorted(response.data, key=lambda d: d.index)
+            # float32 from the start: half the memory of float64 and the
+            # single-precision BLAS kernels for every dot product after this
+            return [np.asarray(d.embedding, dtype=np.float32) for d in data]
+        
+        batch_size = self.embedding_batch_size
+        results = await asyncio.gather(*(
+            embed(texts[start:start + batch_size]) for start in range(0, len(texts), batch_size)
+        ))
+        return [embedding for batch in results for embedding in batch]
+    
+    # Caching an embedding is not an edit, so updated_at is left as it was
+    _save_embeddings = (
+        update(Item.__table__)
+        .where(Item.__table__.c.id == bindparam("item_id"))
+        .values(
+            embedding=bindparam("embedding"),
+            embedding_hash=bindparam("embedding_hash"),
+            updated_at=Item.__table__.c.updated_at
+        )
+    )
+    
+    def _canonical_text(self, item: Item) -> str:
+        """Item text to embed, with whitespace and case normalized so equal listings hash equal"""
+        return " ".join(f"{item.name} {item.description or ''}".split()).lower()
+    
+    def embedding_hash(self, text: str) -> str:
+        """Cache key for an embedding of text under the current model"""
+        return hashlib.blake2b(f"{self.model}\0{text}".encode(), digest_size=32).hexdigest()
+    
+    def cached_embedding(self, item: Item) -> Optional[np.ndarray]:
+        """
+        Return the item's stored embedding if it was computed from its current text
+        Also accepts a row with the same columns
+        """
+        if item.embedding is None or item.embedding_hash != self.embedding_hash(self._canonical_text(item)):
             return None
+        return np.frombuffer(item.embedding, dtype=np.float32)
     
-    def cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
-        v1 = np.array(vec1)
-        v2 = np.array(vec2)
+    async def get_or_compute_many(self, items: List[Item], db: AsyncSession) -> Dict[int, np.ndarray]:
+        """
+        Get unit-length embeddings for items keyed by item id
+        
+        Items whose stored embedding is missing or stale are looked up in an
+        in-process LRU, then the content-addressed EmbeddingCache; only texts
+        found in neither go to the API, once per distinct text, in batched
+        requests. Results are written back to the item rows so later calls
+        are free.
+        """
+        embeddings = {}
+        misses = []
+        
+        for item in items:
+            embedding = self.cached_embedding(item)
+            if embedding is None:
+                misses.append(item)
+            else:
+                embeddings[item.id] = embedding
+        
+        if not misses:
+            return embeddings
+        
+        miss_hashes = {item.id: self.embedding_hash(self._canonical_text(item)) for item in misses}
+        known = {}
+        for text_hash in set(miss_hashes.values()):
+            embedding = self._text_embeddings.get(text_hash)
+            if embedding is not None:
+                known[text_hash] = embedding
         
-        dot_product = np.dot(v1, v2)
-        norm_v1 = np.linalg.norm(v1)
-        norm_v2 = np.linalg.norm(v2)
+        lookup = set(miss_hashes.values()) - known.keys()
+        if lookup:
+            result = await db.execute(
+                select(EmbeddingCache.text_hash, EmbeddingCache.embedding)
+                .where(EmbeddingCache.text_hash.in_(lookup))
+            )
+            for text_hash, embedding in result:
+                known[text_hash] = np.frombuffer(embedding, dtype=np.float32)
+                self._text_embeddings.put(text_hash, known[text_hash])
+        
+        # text hash -> text, so duplicate texts are embedded once
+        texts = {
+            miss_hashes[item.id]: self._canonical_text(item)
+            for item in misses if miss_hashes[item.id] not in known
+        }
+        cache_rows = []  # New EmbeddingCache entries
+        
+        for text_hash, fresh in zip(texts, await self.get_embeddings(list(texts.values()))):
+            if fresh is None:
+                continue
+            # Stored unit-length, so cosine similarity is a plain dot product
+            known[text_hash] = unit_vector(fresh)
+            self._text_embeddings.put(text_hash, known[text_hash])
+            cache_rows.append({"text_hash": text_hash, "embedding": known[text_hash].tobytes()})
         
-        if norm_v1 == 0 or norm_v2 == 0:
-            return 0.0
+        rows = []  # Item write-backs for the bulk update
         
-        return float(dot_product / (norm_v1 * norm_v2))
+        for item in misses:
+            text_hash = miss_hashes[item.id]
+            if text_hash not in known:
+                continue
+            row = {"item_id": item.id, "embedding": known[text_hash].tobytes(), "embedding_hash": text_hash}
+            rows.append(row)
+            set_committed_value(item, "embedding", row["embedding"])
+            set_committed_value(item, "embedding_hash", text_hash)
+            embeddings[item.id] = known[text_hash]
+        
+        if cache_rows:
+            await db.execute(self._insert_ignore(db, EmbeddingCache), cache_rows)
+        if rows:
+            await db.execute(self._save_embeddings, rows)
+        if cache_rows or rows:
+            await db.commit()
+        
+        return embeddings
+    
+    @staticmethod
+    def _insert_ignore(db: AsyncSession, model):
+        """INSERT that skips rows whose key another request already inserted"""
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        return dialect.insert(model).on_conflict_do_nothing()
+    
+    async def get_item_embedding(self, item: Item, db: AsyncSession) -> Optional[np.ndarray]:
+        """
+        Get the query embedding for an item's name and description
+        Memoized per item and text, so repeat queries skip the DB and the API
+        """
+        key = (item.id, self.embedding_hash(self._canonical_text(item)))
+        embedding = self._query_embeddings.get(key)
+        if embedding is not None:
+            return embedding
+        
+        if "embedding" in inspect(item).unloaded:
+            await db.refresh(item, ["embedding"])
+        embedding = (await self.get_or_compute_many([item], db)).get(item.id)
+        if embedding is not None:
+            self._query_embeddings.put(key, embedding)
+        return embedding
     
     async def find_similar_items(
         self, 
         item: Item, 
-        db: Session,
-        min_similarity: float = None
+        db: AsyncSession,
+        min_similarity: float = None,
+        filters: Sequence = (),
+        limit: Optional[int] = None
     ) -> List[Dict]:
         """
-        Find items similar to the given item
+        Find items similar to the given item, most similar first
         
+        filters are extra WHERE clauses on Item (e.g. a price cap) applied in SQL
+        before candidates are loaded and rescored; filtered results are not cached.
+        limit caps the results after filtering (default: every match).
         Returns list of dicts with: item, similarity_score
         """
         if not self.client:
@@ -79,45 +479,189 @@ class SimilarityEngine:
         
         min_similarity = min_similarity or self.similarity_threshold
         
-        # Create search text from item
-        search_text = f"{item.name} {item.description or ''}"
-        item_embedding = await self.get_embedding(search_text)
+        version = await self._catalog_version(db)
+        matches = self.cache.get(item.id, min_similarity, version)
+        if matches is None:
+            item_embedding = await self.get_item_embedding(item, db)
+            if item_embedding is None:
+                return []
+            
+            matches = self.cache.get_similar(item_embedding, min_similarity, version)
+            if matches is None:
+                matches = await self._compute_similar_items(item, item_embedding, db, min_similarity, filters)
+                # Only complete match lists are cached, so a filtered or capped
+                # query answered from the cache sees every candidate. That also
+                # rules out lists computed while some active items had no
+                # embedding (e.g. a failed API batch), which the catalog version
+                # wouldn't catch once they are embedded.
+                if not filters and len(self.index) == version[0]:
+                    self.cache.set(item.id, min_similarity, version, item_embedding, matches)
+        
+        return await self._load_matches(item, matches, db, filters, limit)
+    
+    async def _catalog_version(self, db: AsyncSession) -> Tuple:
+        """Active item count and max id; changes whenever an item is added or removed"""
+        result = await db.execute(
+            select(func.count(Item.id), func.max(Item.id)).where(Item.is_active == True)
+        )
+        return tuple(result.one())
+    
+    async def _load_matches(
+        self,
+        item: Item,
+        matches: List[Tuple[int, float]],
+        db: AsyncSession,
+        filters: Sequence = (),
+        limit: Optional[int] = None
+    ) -> List[Dict]:
+        """Resolve (item_id, score) matches to the active items passing filters, best limit first"""
+        scores = {item_id: score for item_id, score in matches if item_id != item.id}
+        if not scores:
+            return []
+        
+        conditions = [Item.is_active == True, Item.id.in_(scores), *filters]
+        if limit is not None and len(scores) > limit:
+            # Filter by id first so only the items returned are loaded
+            result = await db.execute(select(Item.id).where(*conditions))
+            top_ids = heapq.nlargest(limit, result.scalars().all(), key=scores.__getitem__)
+            conditions = [Item.id.in_(top_ids)]
+        
+        result = await db.execute(select(Item).where(*conditions))
+        similar_items = [
+            {'item': other_item, 'similarity_score': scores[other_item.id]}
+            for other_item in result.scalars().all()
+        ]
+        similar_items.sort(key=lambda x: x['similarity_score'], reverse=True)
+        return similar_items
+    
+    async def _compute_similar_items(
+        self,
+        item: Item,
+        item_embedding: np.ndarray,
+        db: AsyncSession,
+        min_similarity: float,
+        filters: Sequence = ()
+    ) -> List[Tuple[int, float]]:
+        """Score every other active item against the query embedding, as (item_id, score) best first"""
+        index = await self._refresh_index(db)
+        
+        # Approximate cosine similarity from the index, then exact float32 scores
+        # for the items that could clear the threshold. Stored embeddings are
+        # unit-length, so only the query needs normalizing.
+        query = unit_vector(item_embedding)
+        candidate_ids = index.search(query, min_similarity - self.rerank_margin)
+        candidate_ids = candidate_ids[candidate_ids != item.id].tolist()
+        if not candidate_ids:
+            return []
         
-        if not item_embedding:
+        # Rescore from the stored vectors alone; only the survivors are loaded
+        # as Item objects
+        result = await db.execute(
+            select(Item.id, Item.embedding).where(
+                Item.is_active == True,
+                Item.id.in_(candidate_ids),
+                Item.embedding.is_not(None),
+                *filters
+            )
+        )
+        rows = result.all()
+        if not rows:
             return []
         
-        # Get all other active items
-        other_items = db.query(Item).filter(
-            Item.is_active == True,
-            Item.id != item.id
-        ).all()
+        ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=len(rows))
+        # One float32 matrix-vector product (BLAS sgemv) over the candidates
+        matrix = np.frombuffer(b"".join(row.embedding for row in rows), dtype=np.float32)
+        scores = matrix.reshape(len(rows), -1) @ query
+        
+        # Threshold, then sort only the matches
+        mask = scores >= min_similarity
+        ids, scores = ids[mask], scores[mask]
+        order = np.argsort(-scores, kind="stable")
         
-        similar_items = []
+        return list(zip(ids[order].tolist(), scores[order].tolist()))
+    
+    async def _refresh_index(self, db: AsyncSession) -> EmbeddingIndex:
+        """
+        Sync the index with the active items' stored embeddings
         
-        for other_item in other_items:
-            other_text = f"{other_item.name} {other_item.description or ''}"
-            other_embedding = await self.get_embedding(other_text)
+        Only the (id, embedding_hash) columns are read to find changes; full rows
+        are loaded just for items that are new or re-embedded, or for all items
+        when the index needs a rebuild.
+        """
+        async with self._index_lock:
+            result = await db.execute(
+                select(Item.id, Item.embedding_hash).where(Item.is_active == True)
+            )
+            current = dict(result.all())
             
-            if not other_embedding:
-                continue
+            index = self.index
+            removed = [item_id for item_id in index.hashes if item_id not in current]
+            if removed:
+                index.remove(removed)
+            
+            stale = [
+                item_id for item_id, embedding_hash in current.items()
+                if embedding_hash is None or index.hashes.get(item_id) != embedding_hash
+            ]
+            if not stale:
+                return index
             
-            similarity = self.cosine_similarity(item_embedding, other_embedding)
+            # Small changes go into the existing index; anything bigger, or vectors
+            # too far outside its calibrated range, rebuild it from every active item
+            if len(stale) <= len(index):
+                vectors, hashes = await self._load_vectors(db, stale)
+                if index.add(vectors, hashes):
+                    return index
             
-            if similarity >= min_similarity:
-                similar_items.append({
-                    'item': other_item,
-                    'similarity_score': similarity
-                })
+            vectors, hashes = await self._load_vectors(db)
+            index.build(vectors, hashes)
+            return index
+    
+    async def _load_vectors(
+        self,
+        db: AsyncSession,
+        item_ids: Optional[List[int]] = None
+    ) -> Tuple[Dict[int, np.ndarray], Dict[int, str]]:
+        """Embeddings and their hashes for active items (default: all)"""
+        query = (
+            select(Item.id, Item.name, Item.description, Item.embedding, Item.embedding_hash)
+            .where(Item.is_active == True)
+        )
+        if item_ids is not None:
+            query = query.where(Item.id.in_(item_ids))
         
-        # Sort by similarity (highest first)
-        similar_items.sort(key=lambda x: x['similarity_score'], reverse=True)
+        vectors = {}
+        hashes = {}
+        misses = []
         
-        return similar_items
+        # Stream plain rows rather than building an ORM object per item
+        result = await db.stream(query.execution_options(yield_per=self.load_batch_size))
+        async for row in result:
+            embedding = self.cached_embedding(row)
+            if embedding is None:
+                misses.append(row.id)
+            else:
+                vectors[row.id] = embedding
+                hashes[row.id] = row.embedding_hash
+        
+        # Items without a valid cached embedding are embedded and written back
+        for start in range(0, len(misses), self.load_batch_size):
+            result = await db.execute(
+                select(Item)
+                .options(undefer(Item.embedding))
+                .where(Item.id.in_(misses[start:start + self.load_batch_size]))
+            )
+            items = result.scalars().all()
+            computed = await self.get_or_compute_many(items, db)
+            vectors.update(computed)
+            hashes.update({item.id: item.embedding_hash for item in items if item.id in computed})
+        
+        return vectors, hashes
     
     async def find_better_deals(
         self,
         item: Item,
-        db: Session,
+        db: AsyncSession,
         price_discount: float = 0.10  # 10% cheaper
     ) -> List[Dict]:
         """
@@ -127,60 +671,75 @@ class SimilarityEngine:
         1. Similar (above threshold)
         2. At least X% cheaper
         """
-        similar_items = await self.find_similar_items(item, db)
-        
+        # Without a current price there is nothing to be cheaper than
         if not item.current_price:
-            return similar_items
+            return []
         
-        better_deals = []
+        # Only items at or under the target price are loaded and rescored
         target_price = item.current_price * (1 - price_discount)
+        better_deals = await self.find_similar_items(
+            item, db,
+            filters=[Item.current_price <= target_price]
+        )
         
-        for similar in similar_items:
-            other_item = similar['item']
-            if other_item.current_price and other_item.current_price <= target_price:
-                similar['savings'] = item.current_price - other_item.current_price
-                similar['savings_percent'] = (similar['savings'] / item.current_price) * 100
-                better_deals.append(similar)
+        for deal in better_deals:
+            deal['savings'] = item.current_price - deal['item'].current_price
+            deal['savings_percent'] = (deal['savings'] / item.current_price) * 100
         
         return better_deals
     
     async def create_similar_item_alerts(
         self,
         item: Item,
-        db: Session
+        db: AsyncSession
     ):
         """
         Check for similar items with better prices and create alerts
         Should be called periodically or when new items are added
         """
         better_deals = await self.find_better_deals(item, db)
+        if not better_deals:
+            return
+        
+        # Items we already alerted about, in one query; alerts from before
+        # related_item_id existed are matched by name in their message
+        result = await db.execute(
+            select(Alert.related_item_id, Alert.message).where(
+                Alert.item_id == item.id,
+                Alert.alert_type == "similar_item"
+            )
+        )
+        alerted_ids = set()
+        legacy_messages = []
+        for related_item_id, message in result:
+            if related_item_id is None:
+                legacy_messages.append(message or "")
+            else:
+                alerted_ids.add(related_item_id)
+        
+        alert_rows = []  # Alerts to bulk insert
         
         for deal in better_deals:
             other_item = deal['item']
             
-            # Check if we already have a recent alert for this combination
-            existing = db.query(Alert).filter(
-                Alert.item_id == item.id,
-                Alert.alert_type == "similar_item",
-                Alert.message.contains(other_item.name)
-            ).first()
-            
-            if existing:
+            if other_item.id in alerted_ids or any(other_item.name in message for message in legacy_messages):
                 continue
             
-            # Create alert
-            alert = Alert(
-                item_id=item.id,
-                alert_type="similar_item",
-                message=(
+            alert_rows.append({
+                "item_id": item.id,
+                "related_item_id": other_item.id,
+                "alert_type": "similar_item",
+                "is_read": False,
+                "message": (
                     f"Found similar item '{other_item.name}' for ${other_item.current_price:.2f} "
                     f"({deal['savings_percent']:.0f}% cheaper, save ${deal['savings']:.2f})"
                 )
-            )
-            db.add(alert)
-            logger.info(f"Created similar item alert for item {item.id}")
+            })
         
-        db.commit()
+        if alert_rows:
+            await db.execute(insert(Alert), alert_rows)
+            await db.commit()
+            logger.info(f"Created {len(alert_rows)} similar item alert(s) for item {item.id}")
 
 # Global instance
 similarity_engine = SimilarityEngine()
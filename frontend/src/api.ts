@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { Item, ItemCreate, PriceHistory, Alert, SimilarItem, BetterDeal } from './types';
+import { Item, ItemCreate, PriceHistory, Alert, Page, SimilarItem, BetterDeal } from './types';
 
 const api = axios.create({
   baseURL: '/api',
@@ -10,8 +10,8 @@ const api = axios.create({
 
 // Items
 export const getItems = async (): Promise<Item[]> => {
-  const { data } = await api.get('/items');
-  return data;
+  const { data } = await api.get<Page<Item>>('/items');
+  return data.items;
 };
 
 export const getItem = async (id: number): Promise<Item> => {
@@ -29,15 +29,16 @@ export const deleteItem = async (id: number): Promise<void> => {
 };
 
 // Price History
+// The API pages newest first; the first page is the most recent checks, oldest first for charting
 export const getPriceHistory = async (itemId: number): Promise<PriceHistory[]> => {
-  const { data } = await api.get(`/items/${itemId}/history`);
-  return data;
+  const { data } = await api.get<Page<PriceHistory>>(`/items/${itemId}/history`);
+  return data.items.reverse();
 };
 
 // Alerts
 export const getAlerts = async (unreadOnly: boolean = false): Promise<Alert[]> => {
-  const { data } = await api.get('/alerts', { params: { unread_only: unreadOnly } });
-  return data;
+  const { data } = await api.get<Page<Alert>>('/alerts', { params: { unread_only: unreadOnly } });
+  return data.items;
 };
 
 export const markAlertRead = async (id: number): Promise<void> => {
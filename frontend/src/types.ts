@@ -38,6 +38,11 @@ export interface Alert {
   is_read: boolean;
 }
 
+export interface Page<T> {
+  items: T[];
+  next_cursor: string | null;
+}
+
 export interface SimilarItem {
   item: Item;
   similarity_score: number;